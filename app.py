@@ -1,15 +1,14 @@
 import streamlit as st
-from PIL import Image
-import requests
-from io import BytesIO
-import time
 import json
 import random
 import os
+import html
 import shutil
-from collection_log_randomizer import get_random_collection_log_item, scrape_collection_log, get_item_by_id
-from temple_api import TempleApi
-from item_lookup_service import get_item
+from collection_log_randomizer import get_random_collection_log_item, get_data, get_item_by_id
+from temple_api import TempleApi, extract_unowned_ids
+from item_lookup_service import get_items
+from concurrent.futures import ThreadPoolExecutor
+from http_session import fetch_many
 
 # Set page config
 st.set_page_config(
@@ -21,6 +20,30 @@ st.set_page_config(
 # Cache file from collection_log_randomizer
 CACHE_FILE = "collection_log_data.json"
 
+# Maximum number of progress bar updates while looking up unowned items
+PROGRESS_UPDATES = 20
+
+# Number of concurrent icon downloads when prefetching in the background, kept low to go easy on the wiki
+ICON_PREFETCH_WORKERS = 4
+
+# Sources shown for unowned items that aren't in the local collection log data
+UNOWNED_ITEM_SOURCES = ({
+    "category": "Temple Mode",
+    "subcategory": "Unowned Item"
+},)
+
+# HTML templates for the item card, rendered with a single st.markdown call
+ITEM_CARD_TEMPLATE = (
+    "<div class='item-card'>"
+    "<p class='item-name'>{name}</p>"
+    "<p class='item-source'>Source: {source}</p>"
+    "<p class='item-category'>Category: {category}</p>"
+    "{sources_list}"
+    "</div>"
+)
+SOURCE_LIST_TEMPLATE = "<div class='source-list'><p>This item appears in {count} places:</p><ul>{sources}</ul></div>"
+SOURCE_TEMPLATE = "<li>{category} &gt; {subcategory}</li>"
+
 # Custom CSS for styling
 st.markdown("""
 <style>
@@ -77,36 +100,75 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # Initialize session state variables
-if 'current_item' not in st.session_state:
-    st.session_state.current_item = None
-if 'temple_api' not in st.session_state:
-    st.session_state.temple_api = TempleApi()
-if 'rsn' not in st.session_state:
-    st.session_state.rsn = ""
-if 'temple_data' not in st.session_state:
-    st.session_state.temple_data = None
-if 'debug_info' not in st.session_state:
-    st.session_state.debug_info = {}
-if 'available_unowned_items' not in st.session_state:
-    st.session_state.available_unowned_items = []
+st.session_state.setdefault('current_item', None)
+st.session_state.setdefault('rsn', "")
+st.session_state.setdefault('temple_data', None)
+st.session_state.setdefault('debug_info', {})
+st.session_state.setdefault('available_unowned_items', ())
 
 # Preload data function to avoid loading on each reroll
-@st.cache_resource
+@st.cache_resource(show_spinner=False)
 def load_collection_log_data():
     """Load collection log data and cache it"""
-    return scrape_collection_log()
+    return get_data()
+
+# Icon bytes keyed by URL, shared by every session so each icon is downloaded at most once
+@st.cache_resource(show_spinner=False)
+def get_icon_cache():
+    """Create the shared icon cache"""
+    return {}
+
+# Single background worker that fills the icon cache without blocking the app
+@st.cache_resource(show_spinner=False)
+def get_icon_prefetcher():
+    """Create the background icon prefetch worker"""
+    return ThreadPoolExecutor(max_workers=1)
+
+def _prefetch_icons(urls):
+    """Download icons that aren't cached yet into the shared icon cache"""
+    icon_cache = get_icon_cache()
+    # Another session's prefetch may have fetched some of these while this one was queued
+    icon_cache.update(fetch_many((url for url in urls if url not in icon_cache), max_workers=ICON_PREFETCH_WORKERS))
 
-# Function to download and display image
-def display_item_image(image_url):
+def prefetch_icons(urls):
+    """Queue a background download of any icons that aren't cached yet"""
+    icon_cache = get_icon_cache()
+    missing = [url for url in urls if url and url not in icon_cache]
+    if missing:
+        get_icon_prefetcher().submit(_prefetch_icons, missing)
+
+# Shared Temple API handler
+@st.cache_resource(show_spinner=False)
+def get_temple_api():
+    """Create the Temple API handler once and share it"""
+    return TempleApi()
+
+class TempleFetchError(Exception):
+    """Raised inside the cached Temple API calls so error responses are never cached"""
+    def __init__(self, data):
+        super().__init__(data.get("error"))
+        self.data = data
+
+# Cached Temple API calls so repeat requests for the same player don't hit the API again
+@st.cache_data(ttl=300, show_spinner=False)
+def _fetch_temple_collection_log_cached(rsn):
+    """Fetch a player's collection log from TempleOSRS, raising on error responses"""
+    data = get_temple_api().get_collection_log(rsn)
+    if "error" in data:
+        raise TempleFetchError(data)
+    return data
+
+def fetch_temple_collection_log(rsn, force_refresh=False):
+    """Fetch a player's collection log from TempleOSRS"""
+    if force_refresh:
+        # Skip the cache entirely and drop the result that is now stale
+        _fetch_temple_collection_log_cached.clear()
+        return get_temple_api().get_collection_log(rsn, force_refresh=True)
+    
     try:
-        if not image_url:
-            return None
-        response = requests.get(image_url)
-        img = Image.open(BytesIO(response.content))
-        return img
-    except Exception as e:
-        st.error(f"Error loading image: {e}")
-        return None
+        return _fetch_temple_collection_log_cached(rsn)
+    except TempleFetchError as e:
+        return e.data
 
 # Function to get collection log status from Temple API
 def get_collection_log_status(rsn, force_refresh=False):
@@ -114,14 +176,16 @@ def get_collection_log_status(rsn, force_refresh=False):
     # Check if we need to refresh the data
     if force_refresh or not st.session_state.temple_data or st.session_state.rsn != rsn:
         with st.spinner("Fetching collection log data from TempleOSRS..."):
-            temple_api = st.session_state.temple_api
-            data = temple_api.get_collection_log(rsn, force_refresh)
+            data = fetch_temple_collection_log(rsn, force_refresh)
             st.session_state.temple_data = data
             st.session_state.rsn = rsn
             
+            # Drop any previously loaded player's items so they're never sampled for this one
+            st.session_state.available_unowned_items = ()
+            
             # If data is valid and not an error, preload all unowned items
             if "error" not in data:
-                preload_unowned_items(rsn)
+                preload_unowned_items(data)
     else:
         data = st.session_state.temple_data
     
@@ -129,96 +193,84 @@ def get_collection_log_status(rsn, force_refresh=False):
     return data
 
 # Function to preload all unowned items
-def preload_unowned_items(rsn):
-    """Preload and cache all unowned item details"""
+def preload_unowned_items(data):
+    """Preload and cache all unowned item details from a player's collection log data"""
     with st.spinner("Loading your unowned collection log items..."):
         try:
-            # Get all unowned IDs
-            temple_api = st.session_state.temple_api
-            unowned_ids = temple_api.get_unowned_items(rsn)
+            # Get all unowned IDs from the already fetched log
+            unowned_ids = extract_unowned_ids(data)
             
             if not unowned_ids:
                 st.warning("No unowned items found in your collection log.")
-                st.session_state.available_unowned_items = []
+                st.session_state.available_unowned_items = ()
                 return
             
             st.session_state.debug_info["unowned_count"] = len(unowned_ids)
             st.session_state.debug_info["unowned_sample"] = unowned_ids[:5] if unowned_ids else []
             
-            # Look up all items in parallel
             available_items = []
-            looked_up_items = []
-            
-            # Load local collection log data once to avoid repeated calls
-            local_data = load_collection_log_data()["unique_items"]
+            looked_up_count = 0
             
-            # Create a name-based lookup dictionary to speed up matching
-            local_items_by_name = {}
-            for item in local_data:
-                name = item.get("name", "").lower()
-                if name:
-                    local_items_by_name[name] = item
+            # Name-based lookup built once alongside the cached collection log data
+            local_items_by_name = load_collection_log_data()["items_by_name_lower"]
             
             # Create progress bar
             progress_text = "Looking up items..."
             progress_bar = st.progress(0, text=progress_text)
-            total_items = len(unowned_ids)
             
-            # Process all unowned IDs
-            for i, item_id in enumerate(unowned_ids):
-                # Update progress
-                progress_percent = int((i / total_items) * 100)
-                progress_bar.progress(progress_percent / 100, text=f"{progress_text} ({i}/{total_items})")
-                
-                # Look up item details
-                item_details = get_item(item_id)
+            # Resolve all unowned IDs in one bulk lookup, updating progress at most PROGRESS_UPDATES times
+            progress_step = max(1, len(unowned_ids) // PROGRESS_UPDATES)
+            def update_progress(done, total):
+                if done % progress_step == 0 or done == total:
+                    progress_bar.progress(done / total, text=f"{progress_text} ({done}/{total})")
+            
+            details_map = get_items(unowned_ids, progress_callback=update_progress)
+            
+            # Process the resolved items locally
+            for item_id in unowned_ids:
+                item_details = details_map.get(item_id)
                 if item_details:
-                    # Create an item object in the format expected by our app
-                    looked_up_item = {
-                        "id": int(item_id),
-                        "name": item_details["name"],
-                        "category": "Unknown",  # We don't have category info
-                        "subcategory": "Unknown",
-                        "icon": item_details["icon"],
-                        "sources": [{
-                            "category": "Temple Mode",
-                            "subcategory": "Unowned Item"
-                        }]
-                    }
-                    
-                    looked_up_items.append(looked_up_item)
+                    looked_up_count += 1
                     
                     # Try to match with our local item database for better category info
                     item_name_lower = item_details["name"].lower()
                     if item_name_lower in local_items_by_name:
-                        # If we found a local match, use that instead for better data
+                        # If we found a local match, reference the shared cached item instead of copying it
                         available_items.append(local_items_by_name[item_name_lower])
                     else:
-                        # Otherwise use our looked up item
-                        available_items.append(looked_up_item)
+                        # Otherwise keep only the fields needed to display the item
+                        available_items.append({
+                            "name": item_details["name"],
+                            "icon": item_details["icon"],
+                            "sources": UNOWNED_ITEM_SOURCES
+                        })
             
-            # Complete progress bar and remove it
-            progress_bar.progress(1.0, text="Completed!")
-            # Wait a moment to let users see the completed progress bar, then clear it
-            time.sleep(0.5)
+            # Lookups are done, remove the progress bar
             progress_bar.empty()
             
             # Store in session state
-            st.session_state.available_unowned_items = available_items
+            st.session_state.available_unowned_items = tuple(available_items)
+            
+            # Download the icons in the background so later rerolls display without any network wait
+            prefetch_icons([item["icon"] for item in available_items])
             
             # Update debug info
             st.session_state.debug_info["available_items_count"] = len(available_items)
-            st.session_state.debug_info["looked_up_items_count"] = len(looked_up_items)
+            st.session_state.debug_info["looked_up_items_count"] = looked_up_count
             
             # Remove success message - just continue silently
             
         except Exception as e:
             st.error(f"Error loading unowned items: {e}")
-            st.session_state.available_unowned_items = []
+            st.session_state.available_unowned_items = ()
 
 # Function to get a random unowned collection log item using Temple API
 def get_temple_mode_item(rsn):
     """Get a random unowned collection log item based on player data from TempleOSRS"""
+    # If this player's unowned items are already loaded, just sample from them
+    if st.session_state.available_unowned_items and st.session_state.rsn == rsn:
+        return random.choice(st.session_state.available_unowned_items)
+    
     # Get collection log data
     data = get_collection_log_status(rsn)
     
@@ -244,12 +296,12 @@ def get_temple_mode_item(rsn):
             st.error(f"Error connecting to TempleOSRS: {error_message}")
             
         # Fall back to regular mode
-        return get_random_collection_log_item(include_duplicates=False)
+        return get_random_collection_log_item(include_duplicates=False, data=load_collection_log_data())
     
     # Check if we have available unowned items
     if not st.session_state.available_unowned_items:
         st.warning("No unowned items found or couldn't fetch data from Temple OSRS. Using random item selection.")
-        return get_random_collection_log_item(include_duplicates=False)
+        return get_random_collection_log_item(include_duplicates=False, data=load_collection_log_data())
     
     # Simply return a random item from our preloaded list
     return random.choice(st.session_state.available_unowned_items)
@@ -269,12 +321,17 @@ mode = st.radio("Select Mode", ["Regular", "Temple Mode"], horizontal=True)
 # If Temple Mode, add RSN input and display collection status
 rsn = ""
 if mode == "Temple Mode":
-    # Simplified layout without columns - just a single input field
-    rsn = st.text_input("Enter RuneScape Name (RSN):", value=st.session_state.rsn)
+    # Put the RSN input in a form so editing it doesn't rerun the app until it's submitted
+    with st.form("rsn_form"):
+        rsn_input = st.text_input("Enter RuneScape Name (RSN):", value=st.session_state.rsn)
+        submitted = st.form_submit_button("Load collection log")
+    
+    # Use the newly submitted RSN, otherwise keep the one already loaded
+    rsn = rsn_input if submitted else st.session_state.rsn
     
     # If we have an RSN, fetch and display collection log status
     if rsn:
-        # Fetch data (without refresh button)
+        # Fetch data (only hits the API when the RSN has changed)
         temple_data = get_collection_log_status(rsn, force_refresh=False)
         
         # Display collection log status if available
@@ -300,12 +357,9 @@ if mode == "Temple Mode":
 roll_button = st.button("🎲 Roll for Random Collection Log Item", use_container_width=True)
 if roll_button:
     with st.spinner("Rolling..."):
-        # Add small delay for dramatic effect
-        time.sleep(0.5)
-        
         # Get item based on mode
         if mode == "Regular":
-            st.session_state.current_item = get_random_collection_log_item(include_duplicates=False)
+            st.session_state.current_item = get_random_collection_log_item(include_duplicates=False, data=load_collection_log_data())
         else:  # Temple Mode
             if not rsn:
                 st.error("Please enter a RuneScape Name (RSN) to use Temple Mode.")
@@ -318,36 +372,40 @@ if roll_button:
 if st.session_state.current_item:
     item = st.session_state.current_item
     
-    st.markdown("<div class='item-card'>", unsafe_allow_html=True)
-    
     col1, col2 = st.columns([1, 3])
     
     with col1:
-        img = display_item_image(item["icon"])
-        if img:
-            st.image(img, width=80)
+        # Use the prefetched icon if we have one, otherwise let the browser fetch and cache it
+        if item.get("icon"):
+            st.image(get_icon_cache().get(item["icon"], item["icon"]), width=80)
     
     with col2:
-        st.markdown(f"<p class='item-name'>{item['name']}</p>", unsafe_allow_html=True)
-        
+        sources_list = ""
         if 'sources' in item and len(item['sources']) > 0:
             # Get primary source
             primary_source = item['sources'][0]
-            st.markdown(f"<p class='item-source'>Source: {primary_source['subcategory']}</p>", unsafe_allow_html=True)
-            st.markdown(f"<p class='item-category'>Category: {primary_source['category']}</p>", unsafe_allow_html=True)
+            source = primary_source['subcategory']
+            category = primary_source['category']
             
             # If there are multiple sources, show them all
             if len(item['sources']) > 1:
-                st.markdown("<div class='source-list'>", unsafe_allow_html=True)
-                st.markdown(f"This item appears in {len(item['sources'])} places:")
-                for source in item['sources']:
-                    st.markdown(f"- {source['category']} > {source['subcategory']}")
-                st.markdown("</div>", unsafe_allow_html=True)
+                sources_list = SOURCE_LIST_TEMPLATE.format(
+                    count=len(item['sources']),
+                    sources="".join(
+                        SOURCE_TEMPLATE.format(category=html.escape(src['category']), subcategory=html.escape(src['subcategory']))
+                        for src in item['sources']
+                    )
+                )
         else:
             # Fallback for items without sources
-            st.markdown(f"<p class='item-source'>Source: {item['subcategory']}</p>", unsafe_allow_html=True)
-            st.markdown(f"<p class='item-category'>Category: {item['category']}</p>", unsafe_allow_html=True)
-    
-    st.markdown("</div>", unsafe_allow_html=True)
+            source = item['subcategory']
+            category = item['category']
+        
+        st.markdown(ITEM_CARD_TEMPLATE.format(
+            name=html.escape(item['name']),
+            source=html.escape(source),
+            category=html.escape(category),
+            sources_list=sources_list
+        ), unsafe_allow_html=True)
 
 # Run the app with: streamlit run app.py 
\ No newline at end of file
@@ -1,13 +1,29 @@
-import requests
 import re
-import json
 import os
 import random
-from bs4 import BeautifulSoup
+import functools
+import orjson
+from pathlib import Path
+import lxml.html
+from lxml import etree
 from urllib.parse import urlparse, parse_qs
+from http_session import SESSION, REQUEST_TIMEOUT
 
 # Cache file to avoid repeated scraping
 CACHE_FILE = "collection_log_data.json"
+# Bump whenever the cached data layout changes so stale caches are re-scraped
+CACHE_VERSION = 1
+
+# Precompiled XPath queries used by the scraper
+HEADLINE_XPATH = etree.XPath('.//span[contains(concat(" ", normalize-space(@class), " "), " mw-headline ")]')
+CATEGORY_XPATH = etree.XPath('//h2[.//span[contains(concat(" ", normalize-space(@class), " "), " mw-headline ")]]')
+CELL_XPATH = etree.XPath('.//td')
+# The item's text link: the last wiki link in a cell that isn't a file/namespace link or an image link
+MAIN_LINK_XPATH = etree.XPath(
+    '(.//a[starts-with(@href, "/w/") and @title and not(contains(@title, ":"))'
+    ' and not(starts-with(@href, "/w/File:")) and not(img)])[last()]'
+)
+IMG_SRC_XPATH = etree.XPath('(.//img/@src)[1]')
 
 def extract_item_id_from_url(url):
     """
@@ -34,42 +50,38 @@ def extract_item_id_from_url(url):
     # If we can't find an ID, return None
     return None
 
+def index_items_by_name(unique_items):
+    """Build a lowercase name -> item lookup over the unique items"""
+    return {item["name"].lower(): item for item in unique_items if item.get("name")}
+
 def scrape_collection_log():
     """Scrape collection log data from the OSRS Wiki"""
     # Check if cache file exists
     if os.path.exists(CACHE_FILE):
-        with open(CACHE_FILE, 'r') as f:
-            data = json.load(f)
+        data = orjson.loads(Path(CACHE_FILE).read_bytes())
+        if data.get("version") == CACHE_VERSION:
             print(f"Loaded cached data with {len(data['items'])} items and {len(data['unique_items'])} unique items")
+            data["items_by_name_lower"] = index_items_by_name(data["unique_items"])
             return data
+        print("Cached data is out of date, re-scraping...")
     
     print("Scraping collection log data from the OSRS Wiki...")
     
     # Get the HTML content of the collection log page
     url = "https://oldschool.runescape.wiki/w/Collection_log"
-    headers = {
-        "User-Agent": "OSRS-Collection-Log-Randomizer/1.0 (Collection log research)"
-    }
-    response = requests.get(url, headers=headers)
+    response = SESSION.get(url, timeout=REQUEST_TIMEOUT)
     response.raise_for_status()
     
-    # Parse with BeautifulSoup to extract structure
-    soup = BeautifulSoup(response.text, 'html.parser')
+    # Parse with lxml to extract structure
+    tree = lxml.html.fromstring(response.content)
     
     # Initialize data structure
     collection_log = {}
     all_items = []
     
-    # Find all h2 elements (main categories)
-    h2_elements = soup.find_all('h2')
-    
-    # Process each main category
-    for h2 in h2_elements:
-        headline = h2.find('span', class_='mw-headline')
-        if not headline:
-            continue
-        
-        category_name = headline.text.strip()
+    # Process each main category (h2 elements with a headline)
+    for h2 in CATEGORY_XPATH(tree):
+        category_name = HEADLINE_XPATH(h2)[0].text_content().strip()
         
         # Skip navigation elements and other non-collection log parts
         if category_name in ['Contents', 'Navigation menu', 'Combat stats', 'Ranks', 'Notes and references']:
@@ -78,63 +90,43 @@ def scrape_collection_log():
         print(f"Processing category: {category_name}")
         collection_log[category_name] = {}
         
-        # Find the next h2 (to limit our search area)
-        next_h2 = h2.find_next('h2')
-        
-        # Find all h3 elements between current h2 and next h2
-        current_element = h2.next_sibling
+        # Walk the siblings after this h2 until the next h2
         current_subcategory = None
         
-        while current_element and current_element != next_h2:
+        for current_element in h2.itersiblings():
+            tag = current_element.tag
+            if tag == 'h2':
+                break
+            
             # Check if this is an h3 (subcategory)
-            if getattr(current_element, 'name', None) == 'h3':
-                headline = current_element.find('span', class_='mw-headline')
-                if headline:
-                    current_subcategory = headline.text.strip()
+            if tag == 'h3':
+                headlines = HEADLINE_XPATH(current_element)
+                if headlines:
+                    current_subcategory = headlines[0].text_content().strip()
                     print(f"  Processing subcategory: {current_subcategory}")
                     collection_log[category_name][current_subcategory] = []
             
             # If this is a table and we have a subcategory, extract items
-            elif getattr(current_element, 'name', None) == 'table' and current_subcategory:
+            elif tag == 'table' and current_subcategory:
                 # Get all table cells - each cell typically contains one item
-                for td in current_element.select('td'):
+                for td in CELL_XPATH(current_element):
                     # In the collection log, each item appears as both an image link and a text link
                     # To avoid counting twice, we'll only take the text link (which is usually the last link in the cell)
-                    links = td.find_all('a', href=True, title=True)
-                    
-                    # Skip empty cells or cells with no valid links
-                    if not links:
-                        continue
-                    
-                    # Find the main link for this item (typically the last non-image link in the cell)
-                    main_link = None
-                    img_link = None
-                    
-                    for link in links:
-                        href = link.get('href', '')
-                        title = link.get('title', '')
-                        
-                        # Skip image links and other non-item links
-                        if (not href.startswith('/w/')) or ':' in title or href.startswith('/w/File:'):
-                            continue
-                        
-                        # If this link has no img tag as direct child, it's likely the text link
-                        if not link.find('img', recursive=False):
-                            main_link = link
-                        else:
-                            img_link = link
+                    main_links = MAIN_LINK_XPATH(td)
                     
                     # If we found a main link, process it
-                    if main_link:
+                    if main_links:
+                        main_link = main_links[0]
+                        
                         # Get item details
                         href = main_link.get('href', '')
                         title = main_link.get('title', '')
                         
                         # Find the image (could be in another link)
                         img_url = ""
-                        img_tag = td.select_one('img')
-                        if img_tag and img_tag.get('src'):
-                            img_url = f"https://oldschool.runescape.wiki{img_tag.get('src')}"
+                        img_src = IMG_SRC_XPATH(td)
+                        if img_src and img_src[0]:
+                            img_url = f"https://oldschool.runescape.wiki{img_src[0]}"
                         
                         # Try to extract item ID
                         item_id = None
@@ -164,20 +156,17 @@ def scrape_collection_log():
                         # Add to collection log
                         collection_log[category_name][current_subcategory].append(item)
                         all_items.append(item)
-            
-            # Move to the next element
-            current_element = current_element.next_sibling
     
-    # Get unique items
+    # Get unique items, collecting every source an item appears in
     unique_items = {}
     for item in all_items:
-        name = item["name"]
-        if name not in unique_items:
-            unique_items[name] = item.copy()
-            unique_items[name]["sources"] = []
+        unique_item = unique_items.get(item["name"])
+        if unique_item is None:
+            # Copy so the sources list doesn't leak into the per-category items
+            unique_item = unique_items[item["name"]] = dict(item, sources=[])
         
         # Add source information
-        unique_items[name]["sources"].append({
+        unique_item["sources"].append({
             "category": item["category"],
             "subcategory": item["subcategory"]
         })
@@ -187,16 +176,8 @@ def scrape_collection_log():
     print(f"Unique items found: {len(unique_items)}")
     print(f"According to the wiki, there are 1,766 slots with 1,568 unique entries")
     
-    # Find most duplicated items
-    item_counts = {}
-    for item in all_items:
-        name = item["name"]
-        if name in item_counts:
-            item_counts[name] += 1
-        else:
-            item_counts[name] = 1
-    
-    duplicate_items = {name: count for name, count in item_counts.items() if count > 1}
+    # Find most duplicated items (an item's occurrence count is its number of sources)
+    duplicate_items = {name: len(item["sources"]) for name, item in unique_items.items() if len(item["sources"]) > 1}
     top_duplicates = sorted(duplicate_items.items(), key=lambda x: x[1], reverse=True)[:10]
     
     print("\nTop items that appear multiple times:")
@@ -205,25 +186,40 @@ def scrape_collection_log():
     
     # Save to cache file
     cache_data = {
+        "version": CACHE_VERSION,
         "structure": collection_log,
         "items": all_items,
         "unique_items": list(unique_items.values())
     }
     
-    with open(CACHE_FILE, 'w') as f:
-        json.dump(cache_data, f, indent=2)
+    Path(CACHE_FILE).write_bytes(orjson.dumps(cache_data))
+    
+    # The name index is derived data, so it is built after saving rather than persisted
+    cache_data["items_by_name_lower"] = index_items_by_name(cache_data["unique_items"])
     
     return cache_data
 
-def get_random_collection_log_item(include_duplicates=False):
+@functools.lru_cache(maxsize=1)
+def get_data():
+    """
+    Get the collection log data, loading it at most once per process
+    
+    This is the entry point for reading collection log data; scrape_collection_log
+    only runs on the first call.
+    """
+    return scrape_collection_log()
+
+def get_random_collection_log_item(include_duplicates=False, data=None):
     """Get a random item from the collection log
     
     Args:
         include_duplicates: If True, includes all item instances (e.g., Dragon pickaxe from all bosses),
                            which means items in multiple places have higher chance.
                            If False (default), gives equal chance to all unique items.
+        data: Already loaded collection log data. If None, uses get_data().
     """
-    data = scrape_collection_log()
+    if data is None:
+        data = get_data()
     
     if include_duplicates:
         # Choose from all item instances
@@ -247,7 +243,7 @@ def get_item_by_id(item_id):
     Returns:
         The item dictionary if found, None otherwise
     """
-    data = scrape_collection_log()
+    data = get_data()
     
     for item in data["unique_items"]:
         if "id" in item and item["id"] == item_id:
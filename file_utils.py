@@ -0,0 +1,29 @@
+"""
+File helpers shared by the on-disk caches of the OSRS Collection Log Randomizer
+"""
+import os
+import tempfile
+
+def atomic_write(path: str, payload: bytes) -> None:
+    """
+    Write bytes to a temporary file and swap it in so a crash can't leave a partial file
+
+    Args:
+        path: The file to write
+        payload: The full contents of the file
+    """
+    # Each write gets its own temporary file so concurrent writes to the same path don't collide
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        # Don't leave the temporary file behind if the write or swap failed
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
@@ -0,0 +1,60 @@
+"""
+Shared HTTP session for the OSRS Collection Log Randomizer
+
+All outgoing requests go through a single requests.Session so TCP connections
+and TLS handshakes are reused between calls.
+"""
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Optional
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Default User-Agent sent with every request unless overridden per call
+USER_AGENT = "OSRS-Collection-Log-Randomizer/1.0 (Collection log research)"
+
+# Connection pool sizing and retry policy
+POOL_CONNECTIONS = 16
+POOL_MAXSIZE = 32
+MAX_RETRIES = Retry(total=3, backoff_factor=0.2)
+# (connect, read) timeout in seconds so a stalled connection can't hang the app
+REQUEST_TIMEOUT = (3, 10)
+# Number of worker threads used by fetch_many
+FETCH_WORKERS = 32
+
+def create_session() -> requests.Session:
+    """Create a requests session with connection pooling and retries"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE, max_retries=MAX_RETRIES)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({"User-Agent": USER_AGENT})
+    return session
+
+# Session shared across the app
+SESSION = create_session()
+
+def _fetch_content(url: str) -> Optional[bytes]:
+    """Fetch a URL and return the response body, or None on failure"""
+    try:
+        response = SESSION.get(url, timeout=REQUEST_TIMEOUT)
+        response.raise_for_status()
+        return response.content
+    except requests.exceptions.RequestException:
+        return None
+
+def fetch_many(urls: Iterable[str], max_workers: int = FETCH_WORKERS) -> Dict[str, bytes]:
+    """
+    Fetch many URLs concurrently over the shared session
+    
+    Args:
+        urls: The URLs to fetch (duplicates and empty values are ignored)
+        max_workers: Maximum number of URLs fetched at once
+        
+    Returns:
+        Dictionary mapping each successfully fetched URL to its response body
+    """
+    unique_urls = list({url for url in urls if url})
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        contents = executor.map(_fetch_content, unique_urls)
+        return {url: content for url, content in zip(unique_urls, contents) if content is not None}
@@ -4,17 +4,27 @@ Item Lookup Service for OSRS Collection Log Items
 This module provides functions to look up OSRS items by their ID using the osrsreboxed database.
 """
 import os
+import sys
 import json
+import atexit
+import pickle
 import logging
-from typing import Dict, Optional, Any
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Optional, Any
+from file_utils import atomic_write
 
-# Set up logging
-logging.basicConfig(level=logging.INFO)
+# Set up logging (handlers and levels are left to the application)
 logger = logging.getLogger("item_lookup")
 
 # Constants
 CACHE_DIR = "item_cache"
-CACHE_FILE = os.path.join(CACHE_DIR, "item_lookup_cache.json")
+CACHE_FILE = os.path.join(CACHE_DIR, "item_lookup_cache.pkl")
+# Previous JSON cache file, migrated to CACHE_FILE on first load
+LEGACY_CACHE_FILE = os.path.join(CACHE_DIR, "item_lookup_cache.json")
+# Number of new cache entries to accumulate before writing the cache to disk
+SAVE_THRESHOLD = 64
 
 # Create cache directory if it doesn't exist
 if not os.path.exists(CACHE_DIR):
@@ -22,22 +32,152 @@ if not os.path.exists(CACHE_DIR):
 
 # Global cache for items we've already looked up
 item_cache = {}
+# IDs we've looked up that aren't in the osrsreboxed database
+_missing_ids = set()
+# Guards cache mutations and saves when lookups run from worker threads
+_cache_lock = threading.RLock()
+# Number of cache entries added since the last save
+_dirty_count = 0
+# Serializes writes to the cache file
+_save_lock = threading.Lock()
+# Single background writer, so threshold saves never block lookups and run in order
+_save_executor = ThreadPoolExecutor(max_workers=1)
+# Whether a background save has been scheduled but hasn't started yet
+_save_pending = False
+
+def _split_missing(entries: Dict[str, Optional[Dict[str, Any]]]) -> None:
+    """Load the legacy JSON cache's flat ID -> item mapping (None for missing items)"""
+    global item_cache, _missing_ids
+    item_cache = {sys.intern(item_id): item for item_id, item in entries.items() if item is not None}
+    _missing_ids = {sys.intern(item_id) for item_id, item in entries.items() if item is None}
+
 if os.path.exists(CACHE_FILE):
     try:
-        with open(CACHE_FILE, 'r') as f:
-            item_cache = json.load(f)
-        logger.info(f"Loaded {len(item_cache)} items from cache")
+        with open(CACHE_FILE, 'rb') as f:
+            cache_data = pickle.load(f)
+        # Intern IDs so cache keys share storage with the items' own "id" strings
+        item_cache = {sys.intern(item_id): item for item_id, item in cache_data["items"].items()}
+        _missing_ids = set(map(sys.intern, cache_data["missing"]))
+        logger.info("Loaded %d items and %d missing IDs from cache", len(item_cache), len(_missing_ids))
+    except Exception as e:
+        logger.error("Error loading cache: %s", e)
+elif os.path.exists(LEGACY_CACHE_FILE):
+    try:
+        with open(LEGACY_CACHE_FILE, 'r') as f:
+            _split_missing(json.load(f))
+        logger.info("Migrating %d items from the JSON cache", len(item_cache))
+        # Mark everything unsaved so the pickle cache gets written
+        _dirty_count = len(item_cache) + len(_missing_ids)
     except Exception as e:
-        logger.error(f"Error loading cache: {e}")
+        logger.error("Error loading legacy cache: %s", e)
 
 def save_cache():
     """Save the item cache to disk"""
-    try:
-        with open(CACHE_FILE, 'w') as f:
-            json.dump(item_cache, f, indent=2)
-        logger.info(f"Saved {len(item_cache)} items to cache")
-    except Exception as e:
-        logger.error(f"Error saving cache: {e}")
+    global _dirty_count
+    with _save_lock:
+        # Snapshot the cache under the lock, then write it out without blocking lookups
+        with _cache_lock:
+            payload = pickle.dumps({"items": item_cache, "missing": sorted(_missing_ids)},
+                                   protocol=pickle.HIGHEST_PROTOCOL)
+            saved_count = _dirty_count
+            _dirty_count = 0
+        
+        try:
+            atomic_write(CACHE_FILE, payload)
+            logger.info("Saved %d items to cache", len(item_cache))
+        except Exception as e:
+            logger.error("Error saving cache: %s", e)
+            # Keep the entries marked unsaved so a later save picks them up
+            with _cache_lock:
+                _dirty_count += saved_count
+
+def _background_save():
+    """Run a scheduled save on the background writer"""
+    global _save_pending
+    with _cache_lock:
+        _save_pending = False
+    save_cache()
+
+def _schedule_save():
+    """Save the cache on the background writer unless a save is already waiting to run"""
+    global _save_pending
+    with _cache_lock:
+        if _save_pending:
+            return
+        _save_pending = True
+    _save_executor.submit(_background_save)
+
+def _add_to_cache(item_id: str, value: Optional[Dict[str, Any]]) -> None:
+    """Add an entry to the item cache (None for missing items), saving in the background once enough entries have accumulated"""
+    global _dirty_count
+    item_id = sys.intern(item_id)
+    with _cache_lock:
+        if value is None:
+            _missing_ids.add(item_id)
+        else:
+            item_cache[item_id] = value
+        _dirty_count += 1
+        if _dirty_count >= SAVE_THRESHOLD:
+            _schedule_save()
+
+def _save_cache_if_dirty():
+    """Wait for background saves, then save any remaining unsaved cache entries (run at exit)"""
+    _save_executor.shutdown(wait=True)
+    if _dirty_count:
+        save_cache()
+
+atexit.register(_save_cache_if_dirty)
+
+@functools.lru_cache(maxsize=1)
+def _get_items_by_id() -> Dict[int, Any]:
+    """Load the osrsreboxed item database once, indexed by item ID (raises ImportError if it isn't installed)"""
+    # Import here to avoid dependency issues if not installed
+    from osrsreboxed import items_api
+    return {item.id: item for item in items_api.load()}
+
+def _standardize_item(item) -> Dict[str, Any]:
+    """Create a standardized item object from an osrsreboxed item"""
+    return {
+        'id': sys.intern(str(item.id)),
+        'name': item.name,
+        'examine': item.examine,
+        'icon': f"https://raw.githubusercontent.com/0xNeffarion/osrsreboxed-db/master/items-icons/{item.id}.png",
+        'members': item.members,
+        'tradeable': item.tradeable,
+        'wiki_url': item.wiki_url
+    }
+
+def _get_item_uncached(item_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Look up an item in the disk cache or the osrsreboxed database
+    
+    Errors are raised rather than returned so they aren't memoized by _get_item_cached.
+    """
+    # Check cache first
+    if item_id in _missing_ids:
+        return None
+    if item_id in item_cache:
+        logger.debug("Cache hit for item %s", item_id)
+        return item_cache[item_id]
+    
+    logger.debug("Looking up item with ID %s", item_id)
+    
+    # Try to find the item by ID
+    item = _get_items_by_id().get(int(item_id))
+    if not item:
+        logger.debug("Item %s not found in osrsreboxed database", item_id)
+        _add_to_cache(item_id, None)
+        return None
+        
+    result = _standardize_item(item)
+    
+    # Cache the result
+    _add_to_cache(item_id, result)
+    return result
+
+# In-process memo of lookups so repeat calls skip the cache checks entirely
+# Missing IDs are memoized as None too; only lookups that raise are retried
+_get_item_cached = functools.lru_cache(maxsize=8192)(_get_item_uncached)
 
 def get_item(item_id: str) -> Optional[Dict[str, Any]]:
     """
@@ -52,51 +192,91 @@ def get_item(item_id: str) -> Optional[Dict[str, Any]]:
     # Convert to string to ensure consistent cache keys
     item_id = str(item_id)
     
-    # Check cache first
-    if item_id in item_cache:
-        logger.info(f"Cache hit for item {item_id}")
-        return item_cache[item_id]
-    
-    logger.info(f"Looking up item with ID {item_id}")
-    
     try:
-        # Import here to avoid dependency issues if not installed
-        from osrsreboxed import items_api
-        
-        # Load all items (this is cached internally)
-        all_items = items_api.load()
-        
-        # Try to find the item by ID
-        item = all_items.lookup_by_item_id(int(item_id))
-        if not item:
-            logger.info(f"Item {item_id} not found in osrsreboxed database")
-            item_cache[item_id] = None
-            save_cache()
-            return None
-            
-        # Create a standardized item object
-        result = {
-            'id': str(item.id),
-            'name': item.name,
-            'examine': item.examine,
-            'icon': f"https://raw.githubusercontent.com/0xNeffarion/osrsreboxed-db/master/items-icons/{item.id}.png",
-            'members': item.members,
-            'tradeable': item.tradeable,
-            'wiki_url': item.wiki_url
-        }
-        
-        # Cache the result
-        item_cache[item_id] = result
-        save_cache()
-        return result
-        
+        return _get_item_cached(item_id)
     except ImportError:
         logger.warning("osrsreboxed not installed. Use 'pip install osrsreboxed' to enable lookup.")
         return None
     except Exception as e:
-        logger.error(f"Error looking up item {item_id} in osrsreboxed: {e}")
+        logger.error("Error looking up item %s in osrsreboxed: %s", item_id, e)
         return None
 
+def get_items(item_ids: Iterable[str],
+              progress_callback: Optional[Callable[[int, int], None]] = None) -> Dict[str, Optional[Dict[str, Any]]]:
+    """
+    Get item details for many IDs at once
+    
+    Cached items are returned directly, the rest are resolved against the osrsreboxed
+    database in a single pass and the cache is saved once at the end.
+    
+    Args:
+        item_ids: The numeric IDs of the items to look up
+        progress_callback: Optional function called as progress_callback(done, total)
+                           as items are resolved
+        
+    Returns:
+        Dictionary mapping each requested ID (as a string) to its item details (or None if not found)
+    """
+    item_ids = [str(item_id) for item_id in item_ids]
+    total = len(item_ids)
+    
+    # Split into cache hits and misses
+    results = {}
+    misses = []
+    for item_id in item_ids:
+        if item_id in _missing_ids:
+            results[item_id] = None
+        elif item_id in item_cache:
+            results[item_id] = item_cache[item_id]
+        else:
+            misses.append(item_id)
+    
+    done = len(results)
+    if progress_callback and done:
+        progress_callback(done, total)
+    
+    if not misses:
+        return results
+    
+    logger.info("Looking up %d items", len(misses))
+    
+    try:
+        lookup = _get_items_by_id().get
+    except ImportError:
+        logger.warning("osrsreboxed not installed. Use 'pip install osrsreboxed' to enable lookup.")
+        results.update(dict.fromkeys(misses))
+        return results
+    
+    # Resolve the misses and report progress without holding the cache lock
+    found = {}
+    not_found = []
+    for item_id in misses:
+        try:
+            item_id = sys.intern(item_id)
+            item = lookup(int(item_id))
+            if item:
+                found[item_id] = results[item_id] = _standardize_item(item)
+            else:
+                not_found.append(item_id)
+                results[item_id] = None
+        except Exception as e:
+            logger.error("Error looking up item %s in osrsreboxed: %s", item_id, e)
+            results[item_id] = None
+        
+        done += 1
+        if progress_callback:
+            progress_callback(done, total)
+    
+    # Add the whole batch to the cache and write it to disk at once, in the background
+    global _dirty_count
+    with _cache_lock:
+        item_cache.update(found)
+        _missing_ids.update(not_found)
+        _dirty_count += len(found) + len(not_found)
+    _schedule_save()
+    
+    return results
+
 # Test function
 def test_lookup():
     """Test the item lookup functionality"""
@@ -104,9 +284,10 @@ def test_lookup():
     test_ids = ['13262', '13277', '22746', '30154', '29836', '29792']
     
     print("Testing item lookup:")
+    items = get_items(test_ids)
     for item_id in test_ids:
         print(f"\nLooking up item ID: {item_id}")
-        item = get_item(item_id)
+        item = items[item_id]
         if item:
             print(f"✅ SUCCESS: {item['name']}")
             print(f"   Icon URL: {item['icon']}")
@@ -116,4 +297,5 @@ def test_lookup():
             print(f"❌ FAILED to find item with ID {item_id}")
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
     test_lookup() 
\ No newline at end of file
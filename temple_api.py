@@ -2,15 +2,87 @@
 Temple OSRS API module for fetching player collection log data
 """
 import requests
-import json
+import orjson
 import time
 import os
-from typing import Dict, List, Optional, Union, Any
+import mmap
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple, Union, Any
+from http_session import create_session, REQUEST_TIMEOUT
+from file_utils import atomic_write
 
 # Cache directory
 CACHE_DIR = "cache"
 # Time to keep cache (24 hours in seconds)
 CACHE_TTL = 24 * 60 * 60
+# Translation table replacing every non-alphanumeric ASCII character with "_" for cache filenames
+_RSN_FILENAME_TABLE = str.maketrans({chr(c): "_" for c in range(128) if not chr(c).isalnum()})
+# Response headers saved alongside a cache file for conditional requests
+VALIDATOR_HEADERS = ("ETag", "Last-Modified")
+# Number of players fetched at once by get_collection_logs
+FETCH_WORKERS = 8
+
+# Use the same headers that worked
+TEMPLE_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7)",
+    "Referer": "https://templeosrs.com/",
+    "Accept": "application/json"
+}
+
+def _split_items(items: Dict[str, Any]) -> Tuple[int, List[str]]:
+    """
+    Count owned items and collect unowned item IDs in a single pass
+    
+    Args:
+        items: The "items" dictionary from a collection log response
+        
+    Returns:
+        Tuple of (number of owned items, list of unowned item IDs)
+    """
+    owned_items = 0
+    unowned_ids = []
+    
+    # The response schema is fixed, so check the entry type once rather than per item
+    sample = next(iter(items.values()), None)
+    if not isinstance(sample, dict):
+        return owned_items, unowned_ids
+    
+    add_unowned = unowned_ids.append
+    for item_id, item_data in items.items():
+        count = item_data.get("count", 0)
+        if count > 0:
+            owned_items += 1
+        elif count == 0:
+            add_unowned(item_id)
+    return owned_items, unowned_ids
+
+def extract_unowned_ids(data: Dict[str, Any]) -> List[str]:
+    """
+    Get the unowned item IDs from a collection log response
+    
+    Args:
+        data: A response from TempleApi.get_collection_log
+        
+    Returns:
+        List of unowned item IDs (as strings), empty if the response is an error
+    """
+    if "error" in data:
+        return []
+    
+    if "data" not in data:
+        return []
+    
+    # Unowned IDs are computed when the data is fetched
+    if "unowned_ids" in data["data"]:
+        return data["data"]["unowned_ids"]
+    
+    # Older cached data doesn't have them, so extract items with count=0 (unowned)
+    # The API response has a simple structure where items is a dictionary
+    # with item IDs as keys, and each value has a "count" field
+    if "items" in data["data"]:
+        return _split_items(data["data"]["items"])[1]
+    
+    return []
 
 class TempleApi:
     """TempleOSRS API handler"""
@@ -18,6 +90,9 @@ class TempleApi:
     def __init__(self, cache_dir: str = CACHE_DIR):
         """Initialize the Temple API handler"""
         self.cache_dir = cache_dir
+        # Keep-alive session with the Temple headers set once for every request
+        self._session = create_session()
+        self._session.headers.update(TEMPLE_HEADERS)
         # Create cache directory if it doesn't exist
         if not os.path.exists(cache_dir):
             os.makedirs(cache_dir)
@@ -25,7 +100,11 @@ class TempleApi:
     def _get_cache_path(self, rsn: str) -> str:
         """Get the path to the cache file for a player"""
         # Clean the RSN to create a valid filename
-        clean_rsn = "".join(c if c.isalnum() else "_" for c in rsn)
+        if rsn.isascii():
+            clean_rsn = rsn.translate(_RSN_FILENAME_TABLE)
+        else:
+            # The table only covers ASCII, so names with e.g. non-breaking spaces take the slow path
+            clean_rsn = "".join(c if c.isalnum() else "_" for c in rsn)
         return os.path.join(self.cache_dir, f"{clean_rsn}.json")
     
     def _is_cache_valid(self, cache_path: str) -> bool:
@@ -40,13 +119,54 @@ class TempleApi:
     
     def _read_cache(self, cache_path: str) -> Dict:
         """Read data from the cache"""
-        with open(cache_path, 'r') as f:
-            return json.load(f)
+        # Parse straight from a memory map rather than copying the file into a bytes object first
+        with open(cache_path, 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as view:
+                return orjson.loads(view)
     
-    def _write_cache(self, cache_path: str, data: Dict) -> None:
-        """Write data to the cache"""
-        with open(cache_path, 'w') as f:
-            json.dump(data, f, indent=2)
+    def _write_cache(self, cache_path: str, data: Dict, response_headers: Optional[Dict] = None) -> None:
+        """Write data to the cache, along with any validators from the response headers"""
+        atomic_write(cache_path, orjson.dumps(data, option=orjson.OPT_INDENT_2))
+        
+        # Keep the ETag/Last-Modified validators so an expired cache can be revalidated
+        meta_path = self._get_meta_path(cache_path)
+        meta = {name: response_headers[name] for name in VALIDATOR_HEADERS
+                if response_headers and name in response_headers}
+        if meta:
+            atomic_write(meta_path, orjson.dumps(meta))
+        elif os.path.exists(meta_path):
+            os.remove(meta_path)
+    
+    def _get_meta_path(self, cache_path: str) -> str:
+        """Get the path to the sidecar file holding a cache file's response validators"""
+        return f"{os.path.splitext(cache_path)[0]}.meta.json"
+    
+    def _get_conditional_headers(self, cache_path: str) -> Dict[str, str]:
+        """Get If-None-Match/If-Modified-Since headers for revalidating a cache file"""
+        meta_path = self._get_meta_path(cache_path)
+        if not (os.path.exists(cache_path) and os.path.exists(meta_path)):
+            return {}
+        
+        try:
+            with open(meta_path, 'rb') as f:
+                meta = orjson.loads(f.read())
+        except (OSError, orjson.JSONDecodeError):
+            meta = None
+        
+        # An unreadable sidecar is treated as missing so the log is simply fetched in full
+        if not isinstance(meta, dict):
+            try:
+                os.remove(meta_path)
+            except OSError:
+                pass
+            return {}
+        
+        headers = {}
+        if "ETag" in meta:
+            headers["If-None-Match"] = meta["ETag"]
+        if "Last-Modified" in meta:
+            headers["If-Modified-Since"] = meta["Last-Modified"]
+        return headers
     
     def get_collection_log(self, rsn: str, force_refresh: bool = False) -> Dict:
         """
@@ -71,18 +191,19 @@ class TempleApi:
         # Use the working URL format for the Temple API
         url = f"https://templeosrs.com/api/collection-log/player_collections.php?player={encoded_rsn}"
         
-        # Use the same headers that worked
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7)",
-            "Referer": "https://templeosrs.com/",
-            "Accept": "application/json"
-        }
-        
         try:
-            response = requests.get(url, headers=headers)
+            # If we have an expired copy, ask the API to only send the data if it changed
+            conditional_headers = {} if force_refresh else self._get_conditional_headers(cache_path)
+            response = self._session.get(url, headers=conditional_headers, timeout=REQUEST_TIMEOUT)
+            
+            # Not modified, so the cached copy is still current: reset its TTL and use it
+            if response.status_code == 304 and conditional_headers:
+                os.utime(cache_path, None)
+                return self._read_cache(cache_path)
+            
             response.raise_for_status()
             
-            data = response.json()
+            data = orjson.loads(response.content)
             
             # Check for API errors
             if isinstance(data, dict) and "error" in data:
@@ -92,8 +213,7 @@ class TempleApi:
             if "data" in data and "items" in data["data"]:
                 items = data["data"]["items"]
                 total_items = len(items)
-                owned_items = sum(1 for _, item_data in items.items() 
-                                 if isinstance(item_data, dict) and item_data.get("count", 0) > 0)
+                owned_items, unowned_ids = _split_items(items)
                 
                 # Add these stats to the response
                 if "data" not in data:
@@ -101,18 +221,34 @@ class TempleApi:
                 
                 data["data"]["total_collections_available"] = total_items
                 data["data"]["total_collections_finished"] = owned_items
+                data["data"]["unowned_ids"] = unowned_ids
             
             # Save valid data to cache
-            self._write_cache(cache_path, data)
+            self._write_cache(cache_path, data, response.headers)
             return data
                 
-        except json.JSONDecodeError as e:
+        except orjson.JSONDecodeError as e:
             return {"error": f"Error parsing TempleOSRS API response: {str(e)}"}
         except requests.exceptions.RequestException as e:
             return {"error": f"Error connecting to TempleOSRS API: {str(e)}"}
         except Exception as e:
             return {"error": f"Unexpected error: {str(e)}"}
     
+    def get_collection_logs(self, rsns: List[str], force_refresh: bool = False) -> Dict[str, Dict]:
+        """
+        Get several players' collection log data from Temple OSRS concurrently
+        
+        Args:
+            rsns: The players' RuneScape Names
+            force_refresh: If True, ignore cache and fetch fresh data
+            
+        Returns:
+            Dictionary mapping each RSN to its collection log data
+        """
+        with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as executor:
+            logs = executor.map(lambda rsn: self.get_collection_log(rsn, force_refresh), rsns)
+            return dict(zip(rsns, logs))
+    
     def get_unowned_items(self, rsn: str, force_refresh: bool = False) -> List[str]:
         """
         Get a list of unowned item IDs for a player
@@ -124,24 +260,7 @@ class TempleApi:
         Returns:
             List of unowned item IDs (as strings)
         """
-        data = self.get_collection_log(rsn, force_refresh)
-        
-        if "error" in data:
-            return []
-        
-        unowned_ids = []
-        
-        # The API response has a simple structure where items is a dictionary
-        # with item IDs as keys, and each value has a "count" field
-        if "data" in data and "items" in data["data"]:
-            items = data["data"]["items"]
-            
-            # Extract items with count=0 (unowned)
-            for item_id, item_data in items.items():
-                if isinstance(item_data, dict) and item_data.get("count", 0) == 0:
-                    unowned_ids.append(item_id)
-        
-        return unowned_ids
+        return extract_unowned_ids(self.get_collection_log(rsn, force_refresh))
 
 if __name__ == "__main__":
     # Test the API with the correct endpoint